@@ -1,6 +1,16 @@
 # data.py
 # Appointment database and available slots for the Appointment Assistant System
 
+import re
+from itertools import compress
+from operator import methodcaller
+from types import MappingProxyType
+
+# Appointment status values shared by every record, stored in display case
+STATUS_CONFIRMED   = "CONFIRMED"
+STATUS_RESCHEDULED = "RESCHEDULED"
+STATUS_CANCELLED   = "CANCELLED"
+
 APPOINTMENTS = {
     "APT001": {
         "patient_name": "John Davis",
@@ -10,7 +20,7 @@ APPOINTMENTS = {
         "doctor": "Dr. Emily Carter",
         "department": "Radiology",
         "type": "MRI Scan",
-        "status": "confirmed",
+        "status": STATUS_CONFIRMED,
         "phone": "555-***-1234",
         "email": "m***@email.com"
     },
@@ -22,7 +32,7 @@ APPOINTMENTS = {
         "doctor": "Dr. James Lee",
         "department": "Pathology",
         "type": "Blood Test",
-        "status": "confirmed",
+        "status": STATUS_CONFIRMED,
         "phone": "555-***-5678",
         "email": "m***@email.com"
     },
@@ -34,14 +44,17 @@ APPOINTMENTS = {
         "doctor": "Dr. Sarah Patel",
         "department": "Radiology",
         "type": "X-Ray",
-        "status": "confirmed",
+        "status": STATUS_CONFIRMED,
         "phone": "555-***-9012",
         "email": "m***@email.com"
     },
 }
 
+# Normalise appointment IDs once so lookups are a single dict hit
+APPOINTMENTS = {apt_id.upper(): apt for apt_id, apt in APPOINTMENTS.items()}
+
 # Available slots for booking new appointments
-AVAILABLE_SLOTS = [
+AVAILABLE_SLOTS = (
     {"slot_id": "SLT001", "date": "2026-03-12", "time": "9:00 AM",  "doctor": "Dr. Emily Carter", "department": "Radiology",    "type": "MRI Scan"},
     {"slot_id": "SLT002", "date": "2026-03-12", "time": "11:00 AM", "doctor": "Dr. James Lee",    "department": "Pathology",    "type": "Blood Test"},
     {"slot_id": "SLT003", "date": "2026-03-13", "time": "2:00 PM",  "doctor": "Dr. Sarah Patel",  "department": "Radiology",    "type": "X-Ray"},
@@ -49,9 +62,12 @@ AVAILABLE_SLOTS = [
     {"slot_id": "SLT005", "date": "2026-03-15", "time": "3:00 PM",  "doctor": "Dr. Lisa Nguyen",  "department": "Neurology",    "type": "Consultation"},
     {"slot_id": "SLT006", "date": "2026-03-17", "time": "8:30 AM",  "doctor": "Dr. Emily Carter", "department": "Radiology",    "type": "MRI Scan"},
     {"slot_id": "SLT007", "date": "2026-03-18", "time": "1:00 PM",  "doctor": "Dr. Kevin Marsh",  "department": "Cardiology",   "type": "ECG"},
-]
+)
 
-PREP_INSTRUCTIONS = {
+# Read-only slot lookup index keyed by upper-cased slot ID
+_SLOTS_BY_ID = MappingProxyType({slot["slot_id"].upper(): slot for slot in AVAILABLE_SLOTS})
+
+PREP_INSTRUCTIONS = MappingProxyType({
     "MRI Scan": (
         "1. Remove all metal objects (jewelry, piercings, hearing aids).\n"
         "2. Avoid eating 4 hours before the scan.\n"
@@ -87,34 +103,100 @@ PREP_INSTRUCTIONS = {
         "4. Write down any questions you want to ask the doctor.\n"
         "5. Bring your insurance card and a valid photo ID."
     ),
-}
+})
 
 # Emergency keywords that trigger immediate safety escalation
-EMERGENCY_KEYWORDS = [
+EMERGENCY_KEYWORDS = (
     "chest pain", "heart attack", "can't breathe", "cannot breathe",
     "difficulty breathing", "stroke", "unconscious", "not breathing",
     "severe bleeding", "overdose", "poisoning", "seizure", "choking",
     "emergency", "dying", "collapsed", "fainted", "suicidal", "suicide"
-]
+)
 
 # Keywords indicating the user wants medical advice (which we must decline)
-MEDICAL_ADVICE_KEYWORDS = [
+MEDICAL_ADVICE_KEYWORDS = (
     "diagnose", "diagnosis", "do i have", "what disease", "what condition",
     "is it cancer", "should i take", "what medication", "what medicine",
     "treat my", "treatment for", "cure for", "symptoms of", "medical advice",
     "what is wrong with me", "what's wrong with me"
-]
+)
+
+# Phrases (regex) that contain a keyword but are not themselves a safety concern.
+# Matched on the raw text, so the words must be adjacent in the same sentence.
+SAFETY_KEYWORD_EXCLUSIONS = (
+    r"seizure[- ]free", r"suicide prevention"
+)
+
+# Both keyword lists tokenised into one trie so a message is scanned once.
+# Phrases match on word boundaries: leading tokens must match exactly and the
+# last token by prefix, so inflections ("seizures", "overdosed") still hit
+# but a keyword buried inside another word does not.
+_TOKEN_RE = re.compile(r"\w+")
+
+def _build_keyword_trie(keywords_by_flag: dict) -> dict:
+    trie = {}
+    for flag, keywords in keywords_by_flag.items():
+        for kw in keywords:
+            *leading, last = _TOKEN_RE.findall(kw)
+            node = trie
+            for token in leading:
+                node = node.setdefault(token, {})
+            # "$" holds {flag: last tokens} for phrases ending at this node
+            node.setdefault("$", {}).setdefault(flag, []).append(last)
+
+    # Freeze the endings into (flag, prefixes) pairs, emergency first, so a
+    # node is checked with one str.startswith(tuple) call per flag
+    def freeze(node):
+        ends = node.pop("$", None)
+        for child in node.values():
+            freeze(child)
+        if ends:
+            node["$"] = tuple((flag, tuple(ends[flag])) for flag in keywords_by_flag if flag in ends)
+
+    freeze(trie)
+    return trie
+
+_SAFETY_TRIE = _build_keyword_trie({
+    "emergency":      EMERGENCY_KEYWORDS,
+    "medical_advice": MEDICAL_ADVICE_KEYWORDS,
+})
+
+# Every keyword phrase starts with a token beginning with one of these, so a
+# message with no such token cannot match and skips the trie walk entirely
+_FIRST_TOKEN_PREFIXES = tuple(
+    [token for token in _SAFETY_TRIE if token != "$"]
+    + [last for _, lasts in _SAFETY_TRIE["$"] for last in lasts]
+)
+
+_EXCLUSION_RE = re.compile(
+    r"\b(?:" + "|".join(SAFETY_KEYWORD_EXCLUSIONS) + r")\b", re.IGNORECASE
+)
 
 # ─────────────────────────────────────────
 # DATABASE HELPER FUNCTIONS
 # ─────────────────────────────────────────
 
+# Well-formed IDs; anything else is rejected before touching the tables
+_APT_ID_RE  = re.compile(r"APT\d{3,}", re.IGNORECASE)
+_SLOT_ID_RE = re.compile(r"SLT\d{3,}", re.IGNORECASE)
+
 def get_appointment(apt_id: str):
+    if not _APT_ID_RE.fullmatch(apt_id):
+        return None
     return APPOINTMENTS.get(apt_id.upper(), None)
 
 def get_all_appointment_ids():
     return list(APPOINTMENTS.keys())
 
+def find_appointments(status: str = None):
+    """Returns {apt_id: appointment} for appointments with the given status (all if None)."""
+    if status is not None:
+        status = status.upper()   # Statuses are stored upper-case
+    return {
+        apt_id: apt for apt_id, apt in APPOINTMENTS.items()
+        if status is None or apt["status"] == status
+    }
+
 def get_prep(appointment_type: str):
     return PREP_INSTRUCTIONS.get(
         appointment_type,
@@ -125,15 +207,61 @@ def get_available_slots():
     return AVAILABLE_SLOTS
 
 def get_slot(slot_id: str):
-    for slot in AVAILABLE_SLOTS:
-        if slot["slot_id"].upper() == slot_id.upper():
-            return slot
-    return None
+    if not _SLOT_ID_RE.fullmatch(slot_id):
+        return None
+    return _SLOTS_BY_ID.get(slot_id.upper())
+
+def find_slots(department: str = None, after: str = None):
+    """
+    Filters available slots by department and/or earliest date (YYYY-MM-DD).
+    ISO dates compare correctly as strings, so no parsing is needed.
+    """
+    return tuple(
+        slot for slot in AVAILABLE_SLOTS
+        if (department is None or slot["department"] == department)
+        and (after is None or slot["date"] >= after)
+    )
+
+def tokenize(text: str) -> list:
+    """Casefolds and splits text into word tokens, once per request."""
+    return _TOKEN_RE.findall(text.casefold())
+
+def detect_safety_flag(tokens: list, text: str = None):
+    """
+    Scans pre-tokenised input once for emergency and medical-advice keywords.
+    If the raw text is given, benign exclusion phrases are cut out of it and
+    the rest is re-tokenised first; any other keyword occurrence still counts.
+    Returns "emergency", "medical_advice" or None. Emergency always wins.
+    """
+    if text is not None and _EXCLUSION_RE.search(text):
+        tokens = tokenize(_EXCLUSION_RE.sub(" ", text))
+
+    # Quick reject: candidate start positions, found with C-level startswith
+    is_candidate = methodcaller("startswith", _FIRST_TOKEN_PREFIXES)
+    starts = list(compress(range(len(tokens)), map(is_candidate, tokens)))
+    if not starts:
+        return None
+
+    flag  = None
+    count = len(tokens)
+
+    for start in starts:
+        # Walk the trie from this token until the first miss
+        node = _SAFETY_TRIE
+        for i in range(start, count):
+            token = tokens[i]
+            for phrase_flag, lasts in node.get("$", ()):
+                if token.startswith(lasts):
+                    if phrase_flag == "emergency":
+                        return "emergency"
+                    flag = phrase_flag
+            node = node.get(token)
+            if node is None:
+                break
+    return flag
 
 def is_emergency(text: str) -> bool:
-    text_lower = text.lower()
-    return any(kw in text_lower for kw in EMERGENCY_KEYWORDS)
+    return detect_safety_flag(tokenize(text), text) == "emergency"
 
 def is_medical_advice_request(text: str) -> bool:
-    text_lower = text.lower()
-    return any(kw in text_lower for kw in MEDICAL_ADVICE_KEYWORDS)
\ No newline at end of file
+    return detect_safety_flag(tokenize(text), text) == "medical_advice"
\ No newline at end of file
@@ -3,27 +3,47 @@
 
 import os
 import uuid
-import json
+import queue
+import atexit
 import logging
+import threading
 from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener
+
+import orjson
+
+from routes import decode_route
 
 # ─────────────────────────────────────────
 # LOGGING SETUP
 # ─────────────────────────────────────────
 
 def setup_logging():
-    """Set up logging to both console and file."""
+    """
+    Set up logging to both console and file.
+    File writes go through a queue so logging never blocks on disk I/O.
+    """
     os.makedirs("logs", exist_ok=True)
 
+    log_queue = queue.Queue()
+    listener  = QueueListener(
+        log_queue,
+        logging.FileHandler("logs/run_log.txt", mode="a")   # Save to file
+    )
+    listener.start()
+    atexit.register(listener.stop)
+
     logging.basicConfig(
         level=logging.INFO,
         format="%(asctime)s | %(levelname)s | %(message)s",
         handlers=[
-            logging.StreamHandler(),                          # Print to terminal
-            logging.FileHandler("logs/run_log.txt", mode="a") # Save to file
+            logging.StreamHandler(),                         # Print to terminal
+            QueueHandler(log_queue)                          # Hand off to file writer
         ]
     )
 
+    _start_trace_writer()
+
 def generate_run_id() -> str:
     """Generate a unique run ID combining timestamp and short UUID."""
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -33,32 +53,81 @@ def generate_run_id() -> str:
 
 # ─────────────────────────────────────────
 # TRACE WRITER
-# Saves execution evidence to a JSON file
+# Appends execution evidence to a JSON-lines file (one record per run)
+# Records are written by a background thread so runs never wait on disk
 # ─────────────────────────────────────────
 
+TRACE_FILE = "logs/traces.jsonl"
+
+_trace_queue  = queue.Queue()
+_trace_thread = None
+_TRACE_STOP   = object()   # Sentinel that tells the writer thread to exit
+TRACE_DRAIN_TIMEOUT = 5    # Seconds to wait for queued traces at exit
+
+
+def _trace_writer_loop():
+    logger = logging.getLogger(__name__)
+    f = None
+    while True:
+        trace = _trace_queue.get()
+        try:
+            if trace is _TRACE_STOP:
+                if f is not None:
+                    f.close()
+                return
+            # Open lazily so a bad path drops records instead of killing the thread
+            if f is None:
+                os.makedirs(os.path.dirname(TRACE_FILE), exist_ok=True)
+                f = open(TRACE_FILE, "ab", buffering=1024 * 1024)
+            f.write(orjson.dumps(trace) + b"\n")
+            # Flush once the backlog is drained rather than per record
+            if _trace_queue.empty():
+                f.flush()
+        except Exception as e:
+            logger.error(f"[TraceWriter] Could not write {TRACE_FILE}: {e}")
+        finally:
+            _trace_queue.task_done()
+
+
+def _stop_trace_writer():
+    """Asks the writer to finish the backlog and waits a bounded time for it."""
+    _trace_queue.put(_TRACE_STOP)
+    _trace_thread.join(timeout=TRACE_DRAIN_TIMEOUT)
+
+
+def _start_trace_writer():
+    """Starts the background trace writer once and drains it at exit."""
+    global _trace_thread
+    if _trace_thread is not None:
+        return
+
+    _trace_thread = threading.Thread(target=_trace_writer_loop, name="trace-writer", daemon=True)
+    _trace_thread.start()
+    atexit.register(_stop_trace_writer)
+
+
 def write_trace(state: dict):
     """
-    Writes a trace/log file for the current run.
+    Queues the trace record for the current run and returns the trace file path.
     Masks any sensitive values before saving.
     """
-    os.makedirs("logs", exist_ok=True)
+    _start_trace_writer()
 
     trace = {
         "run_id":        state.get("run_id", "UNKNOWN"),
         "timestamp":     datetime.now().isoformat(),
         "final_status":  state.get("final_status", "UNKNOWN"),
         "intent":        state.get("intent", "UNKNOWN"),
-        "route_taken":   state.get("route_taken", []),
+        "route_taken":   decode_route(state.get("route_taken", 0)),
         "tool_calls":    state.get("tool_call_count", 0),
         "pii_in_input":  "[MASKED]" if state.get("clean_input") != state.get("user_input") else "none",
         "appointment_id": state.get("appointment_id", "N/A"),
         "middleware_passed": state.get("middleware_passed", False),
         "hitl_approved":    state.get("hitl_approved", False),
+        "hitl_policy":      state.get("hitl_policy", "interactive"),
         "final_response":   state.get("hitl_response", "")
     }
 
-    filename = f"logs/trace_{state.get('run_id', 'unknown')}.json"
-    with open(filename, "w") as f:
-        json.dump(trace, f, indent=2)
+    _trace_queue.put(trace)
 
-    return filename
\ No newline at end of file
+    return TRACE_FILE
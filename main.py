@@ -2,8 +2,14 @@
 # CLI entry point for the Appointment Assistant System
 # Mojisola Akinniyi Medical Office
 
+import asyncio
+import logging
+
 from hitl import setup_logging, generate_run_id, write_trace
-from graph import build_graph
+from graph import build_graph, close_llms
+from routes import decode_route
+
+logger = logging.getLogger(__name__)
 
 
 def print_banner():
@@ -65,40 +71,97 @@ def print_final_output(state: dict, trace_file: str):
     print(f"  Intent   : {intent}")
     print(f"  HITL     : {'Approved' if state.get('hitl_approved') else 'Not required / Escalated'}")
     print(f"  Run ID   : {state['run_id']}")
-    print(f"  Route    : {' -> '.join(state['route_taken'])}")
+    print(f"  Route    : {' -> '.join(decode_route(state['route_taken']))}")
     print(f"  Trace    : {trace_file}")
     print("="*55)
 
-def run_single_request(user_input: str, graph):
+# Empty state shared by every run; mutable fields are replaced per request
+STATE_TEMPLATE = {
+    "user_input":        "",
+    "clean_input":       "",
+    "intent":            "",
+    "appointment_id":    "",
+    "slot_id":           "",
+    "patient_name":      "",
+    "extra_info":        None,
+    "tool_result":       None,
+    "middleware_passed": False,
+    "middleware_reason": "",
+    "hitl_approved":     False,
+    "hitl_response":     "",
+    "final_status":      "",
+    "route_taken":       0,
+    "tool_call_count":   0,
+    "run_id":            "",
+    "hitl_policy":       "interactive",
+    "tokens":            None
+}
+
+
+def new_state(user_input: str, run_id: str, hitl_policy: str = "interactive") -> dict:
+    """Build the initial graph state for one request from the template."""
+    state = STATE_TEMPLATE.copy()
+    state["user_input"]  = user_input
+    state["run_id"]      = run_id
+    state["hitl_policy"] = hitl_policy
+    state["extra_info"]  = {}
+    state["tool_result"] = {}
+    state["tokens"]      = []
+    return state
+
+
+async def run_single_request(user_input: str, graph):
     """Run one request through the graph and return the final state."""
     run_id = generate_run_id()
-
-    initial_state = {
-        "user_input":        user_input,
-        "clean_input":       "",
-        "intent":            "",
-        "appointment_id":    "",
-        "slot_id":           "",
-        "patient_name":      "",
-        "extra_info":        {},
-        "tool_result":       {},
-        "middleware_passed": False,
-        "middleware_reason": "",
-        "hitl_approved":     False,
-        "hitl_response":     "",
-        "final_status":      "",
-        "route_taken":       [],
-        "tool_call_count":   0,
-        "run_id":            run_id
-    }
+    initial_state = new_state(user_input, run_id)
 
     print(f"\n[Run ID: {run_id}]")
-    final_state = graph.invoke(initial_state)
+    final_state = await graph.ainvoke(initial_state)
     trace_file  = write_trace(final_state)
     print_final_output(final_state, trace_file)
     return final_state
 
 
+async def run_batch(user_inputs: list, graph, hitl_policy: str, concurrency: int = 8) -> list:
+    """
+    Run many requests through the graph concurrently for evaluation or replay.
+    No reviewer is at the terminal, so the caller must opt in to unreviewed
+    drafts with hitl_policy="auto_approve"; the blocking interactive review
+    would stall every concurrent run and is rejected.
+    Returns one result per input, in input order: the final state, or an
+    error record with final_status "ERROR" if that run raised. A trace is
+    written for each completed run. The pooled LLM client belongs to the
+    caller's event loop; close it with close_llms() before the loop ends.
+    """
+    if hitl_policy != "auto_approve":
+        raise ValueError(f"run_batch requires hitl_policy='auto_approve', got {hitl_policy!r}")
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run_one(user_input: str) -> dict:
+        async with semaphore:
+            final_state = await graph.ainvoke(
+                new_state(user_input, generate_run_id(), hitl_policy)
+            )
+        write_trace(final_state)
+        return final_state
+
+    results = await asyncio.gather(
+        *(run_one(user_input) for user_input in user_inputs),
+        return_exceptions=True
+    )
+
+    for i, result in enumerate(results):
+        if isinstance(result, Exception):
+            logger.error(f"[Batch] Request {i} failed: {result!r}")
+            results[i] = {
+                "user_input":   user_inputs[i],
+                "final_status": "ERROR",
+                "error":        repr(result)
+            }
+    return results
+
+
 def main():
     setup_logging()
     print_banner()
@@ -106,6 +169,9 @@ def main():
     # Build the graph once and reuse it
     graph = build_graph()
 
+    # One event loop for the whole session so LLM connections are reused across requests
+    loop = asyncio.new_event_loop()
+
     print("\nExample requests you can try:")
     print("  'Show me my appointments'")
     print("  'What slots are available?'")
@@ -132,12 +198,15 @@ def main():
                 print("="*55)
                 break
 
-            run_single_request(user_input, graph)
+            loop.run_until_complete(run_single_request(user_input, graph))
 
         except KeyboardInterrupt:
             print("\n\nSession ended. Goodbye!")
             break
 
+    loop.run_until_complete(close_llms())
+    loop.close()
+
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -2,8 +2,13 @@
 # Safety and control layer for the appointment assistant
 # Implements: PII masking, moderation, tool call limits, and retry logic
 
+import os
 import re
+import bisect
 import logging
+import itertools
+from functools import lru_cache
+from typing import Callable
 
 logger = logging.getLogger(__name__)
 
@@ -12,35 +17,169 @@ logger = logging.getLogger(__name__)
 # Masks sensitive personal information
 # ─────────────────────────────────────────
 
-PII_PATTERNS = {
+_RAW_PII_PATTERNS = {
     "phone":   (r'\b\d{3}[-.\s]?\d{3}[-.\s]?\d{4}\b', "***-***-****"),
-    "email":   (r'\b[\w.+-]+@[\w-]+\.[a-z]{2,}\b',     "***@***.***"),
+    "email":   (r'(?i:(?<![\w.+-])[\w.+-]+@[\w-]+\.[a-z]{2,}\b)', "***@***.***"),
     "ssn":     (r'\b\d{3}-\d{2}-\d{4}\b',               "***-**-****"),
-    "dob":     (r'\b(0[1-9]|1[0-2])[/-](0[1-9]|[12]\d|3[01])[/-]\d{4}\b', "**/**/****"),
+    "dob":     (r'\b(?:0[1-9]|1[0-2])[/-](?:0[1-9]|[12]\d|3[01])[/-]\d{4}\b', "**/**/****"),
 }
 
+PII_REPLACEMENTS = {pii_type: replacement for pii_type, (_, replacement) in _RAW_PII_PATTERNS.items()}
+
+# Characters at least one of which each PII type needs in order to match
+_PII_TRIGGER_CHARS = {"phone": r"\d", "email": "@", "ssn": r"\d", "dob": r"\d"}
+
+# Comma-separated PII types to mask (e.g. "phone,email"); all types when unset
+PII_TYPES_ENV = "PII_TYPES"
+
+
+def _no_pii(text: str) -> dict:
+    return {
+        "original_text": text,
+        "masked_text": text,
+        "pii_detected": False,
+        "pii_types": []
+    }
+
+
+@lru_cache(maxsize=None)
+def _compile_pii_regexes(enabled: frozenset):
+    """
+    Compiles (pii_types, pii_re, trigger_re) for the enabled PII types, or None if none.
+    The enabled types are fused into one alternation of named groups so the
+    text is scanned once. Only the email pattern needs case-insensitivity, so
+    it is scoped to that branch. Its local part may only start where a run of
+    address characters starts, so each run is tried once and the scan stays
+    linear without capping lengths (which would leave long addresses unmasked).
+    """
+    pii_types = [pii_type for pii_type in _RAW_PII_PATTERNS if pii_type in enabled]
+    if not pii_types:
+        return None
+
+    pii_re = re.compile(
+        "|".join(f"(?P<{pii_type}>{_RAW_PII_PATTERNS[pii_type][0]})" for pii_type in pii_types)
+    )
+    # Text without any trigger character cannot match, so the scan can be skipped
+    trigger_re = re.compile("[" + "".join(sorted({_PII_TRIGGER_CHARS[t] for t in pii_types})) + "]")
+    return pii_types, pii_re, trigger_re
+
+
+@lru_cache(maxsize=None)
+def build_pii_scanner(enabled: frozenset) -> Callable[[str], dict]:
+    """Builds a PII masking function specialised to the enabled PII types."""
+    compiled = _compile_pii_regexes(enabled)
+    if compiled is None:
+        return _no_pii
+
+    pii_types, pii_re, trigger_re = compiled
+
+    def scan(text: str) -> dict:
+        if not trigger_re.search(text):
+            return _no_pii(text)
+
+        found = set()
+
+        def _mask(match):
+            found.add(match.lastgroup)
+            return PII_REPLACEMENTS[match.lastgroup]
+
+        masked_text = pii_re.sub(_mask, text)
+        pii_found = [pii_type for pii_type in pii_types if pii_type in found]
+
+        if pii_found:
+            logger.info("[PIIMiddleware] Masked PII types: %s", pii_found)
+
+        return {
+            "original_text": text,
+            "masked_text": masked_text,
+            "pii_detected": len(pii_found) > 0,
+            "pii_types": pii_found
+        }
+
+    return scan
+
+
+@lru_cache(maxsize=1)
+def configured_pii_types() -> frozenset:
+    """
+    PII types enabled through the PII_TYPES environment variable.
+    A misconfigured value falls back to masking every type; masking is only
+    switched off by the explicit value "none".
+    """
+    all_types = frozenset(_RAW_PII_PATTERNS)
+    raw = (os.getenv(PII_TYPES_ENV) or "").strip().lower()
+    if not raw:
+        return all_types
+
+    if raw == "none":
+        logger.warning("[PIIMiddleware] PII masking disabled by %s=none", PII_TYPES_ENV)
+        return frozenset()
+
+    requested = {pii_type.strip() for pii_type in raw.split(",") if pii_type.strip()}
+    unknown = requested - all_types
+    if unknown:
+        logger.warning("[PIIMiddleware] Ignoring unknown PII types: %s", sorted(unknown))
+
+    enabled = requested & all_types
+    if not enabled:
+        logger.warning(
+            "[PIIMiddleware] No valid PII types in %s=%r; masking all types",
+            PII_TYPES_ENV, os.getenv(PII_TYPES_ENV)
+        )
+        return all_types
+    return frozenset(enabled)
+
+
 def pii_middleware(text: str) -> dict:
     """
     Scans text for PII and masks it.
     Returns masked text and a flag indicating if PII was found.
     """
-    masked_text = text
-    pii_found = []
+    return build_pii_scanner(configured_pii_types())(text)
 
-    for pii_type, (pattern, replacement) in PII_PATTERNS.items():
-        if re.search(pattern, masked_text, re.IGNORECASE):
-            masked_text = re.sub(pattern, replacement, masked_text, flags=re.IGNORECASE)
-            pii_found.append(pii_type)
 
-    if pii_found:
-        logger.info(f"[PIIMiddleware] Masked PII types: {pii_found}")
+# Joins batched messages; NUL is not a word, space or separator character,
+# so no PII pattern can match across it
+PII_BATCH_SEPARATOR = "\x00"
 
-    return {
-        "original_text": text,
-        "masked_text": masked_text,
-        "pii_detected": len(pii_found) > 0,
-        "pii_types": pii_found
-    }
+def pii_middleware_batch(texts: list) -> list:
+    """
+    Masks PII in many messages with a single regex pass over one joined buffer.
+    Matches are mapped back to their source message by offset.
+    Returns one pii_middleware-style result per message, in order.
+    """
+    compiled = _compile_pii_regexes(configured_pii_types())
+    if compiled is None or any(PII_BATCH_SEPARATOR in text for text in texts):
+        return [pii_middleware(text) for text in texts]
+
+    pii_types, pii_re, _ = compiled
+    buffer = PII_BATCH_SEPARATOR.join(texts)
+
+    # Offset at which each message starts inside the buffer
+    starts = list(itertools.accumulate((len(text) + 1 for text in texts[:-1]), initial=0))
+    found = [set() for _ in texts]
+
+    def _mask(match):
+        found[bisect.bisect_right(starts, match.start()) - 1].add(match.lastgroup)
+        return PII_REPLACEMENTS[match.lastgroup]
+
+    masked_texts = pii_re.sub(_mask, buffer).split(PII_BATCH_SEPARATOR)
+
+    results = []
+    for text, masked_text, types_found in zip(texts, masked_texts, found):
+        pii_found = [pii_type for pii_type in pii_types if pii_type in types_found]
+        results.append({
+            "original_text": text,
+            "masked_text": masked_text,
+            "pii_detected": len(pii_found) > 0,
+            "pii_types": pii_found
+        })
+
+    masked_count = sum(1 for result in results if result["pii_detected"])
+    if masked_count:
+        logger.info("[PIIMiddleware] Masked PII in %s of %s messages", masked_count, len(texts))
+
+    return results
 
 
 # ─────────────────────────────────────────
@@ -53,16 +192,21 @@ BLOCKED_KEYWORDS = [
     "fraud", "abuse", "threat", "weapon", "explosive"
 ]
 
+# All blocked keywords in one case-insensitive alternation so the input is
+# scanned once without a lowercased copy. The leading word boundary stops
+# "kill" firing inside "skill" while still catching "killing", "hacked", etc.
+BLOCKED_RE = re.compile(r"\b(?:" + "|".join(map(re.escape, BLOCKED_KEYWORDS)) + ")", re.IGNORECASE)
+
 def moderation_middleware(text: str) -> dict:
     """
     Checks input for harmful content.
     Returns a flag and reason if content is blocked.
     """
-    text_lower = text.lower()
-    triggered = [kw for kw in BLOCKED_KEYWORDS if kw in text_lower]
+    found = {match.lower() for match in BLOCKED_RE.findall(text)}
+    triggered = [kw for kw in BLOCKED_KEYWORDS if kw in found]
 
     if triggered:
-        logger.warning(f"[ModerationMiddleware] Blocked keywords detected: {triggered}")
+        logger.warning("[ModerationMiddleware] Blocked keywords detected: %s", triggered)
         return {
             "approved": False,
             "reason": f"Input contains inappropriate content: {triggered}",
@@ -88,7 +232,7 @@ def tool_call_limit_middleware(current_count: int) -> dict:
     Checks if the number of tool calls has exceeded the limit.
     """
     if current_count >= MAX_TOOL_CALLS:
-        logger.warning(f"[ToolCallLimitMiddleware] Limit reached: {current_count}/{MAX_TOOL_CALLS}")
+        logger.warning("[ToolCallLimitMiddleware] Limit reached: %s/%s", current_count, MAX_TOOL_CALLS)
         return {
             "allowed": False,
             "reason": f"Tool call limit of {MAX_TOOL_CALLS} reached. Escalating to human agent."
@@ -111,17 +255,24 @@ def retry_middleware(func, max_retries: int = 3, *args, **kwargs):
     """
     last_error = None
 
-    for attempt in range(1, max_retries + 1):
+    # Fast path: most calls succeed first time, so skip the retry loop entirely
+    if max_retries >= 1:
+        try:
+            return {"success": True, "result": func(*args, **kwargs), "attempts": 1}
+        except Exception as e:
+            last_error = e
+            logger.warning("[RetryMiddleware] Attempt 1 failed: %s", e)
+
+    for attempt in range(2, max_retries + 1):
         try:
             result = func(*args, **kwargs)
-            if attempt > 1:
-                logger.info(f"[RetryMiddleware] Succeeded on attempt {attempt}")
+            logger.info("[RetryMiddleware] Succeeded on attempt %s", attempt)
             return {"success": True, "result": result, "attempts": attempt}
         except Exception as e:
             last_error = e
-            logger.warning(f"[RetryMiddleware] Attempt {attempt} failed: {e}")
+            logger.warning("[RetryMiddleware] Attempt %s failed: %s", attempt, e)
 
-    logger.error(f"[RetryMiddleware] All {max_retries} attempts failed.")
+    logger.error("[RetryMiddleware] All %s attempts failed.", max_retries)
     return {
         "success": False,
         "result": None,
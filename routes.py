@@ -0,0 +1,25 @@
+# routes.py
+# Graph node flags and route decoding, kept free of LLM and HTTP imports
+# so logging and tracing can use them without loading the workflow
+
+from enum import IntFlag
+
+
+class Node(IntFlag):
+    """
+    Graph nodes as bit flags so the route is tracked as one int.
+    Declared in execution order, so decoding the mask yields the route in order.
+    """
+    INPUT_NODE          = 1
+    INTENT_NODE         = 2
+    ACTION_NODE         = 4
+    NEEDS_INFO_NODE     = 8
+    HITL_NODE           = 16
+    ESCALATE_NODE       = 32
+    EMERGENCY_NODE      = 64
+    MEDICAL_ADVICE_NODE = 128
+
+
+def decode_route(route_taken: int) -> list:
+    """Expands a route bitmask into the ordered list of node names."""
+    return [node.name.lower() for node in Node if route_taken & node]
@@ -3,36 +3,49 @@
 
 from data import (
     APPOINTMENTS,
+    STATUS_CONFIRMED,
+    STATUS_RESCHEDULED,
+    STATUS_CANCELLED,
     get_appointment,
     get_prep,
     get_available_slots,
     get_slot
 )
 
-import uuid
+import secrets
+import itertools
 from datetime import datetime
 
+# One-line summaries used when listing appointments and slots
+APPOINTMENT_LINE = "  [{id}] {type} with {doctor} on {date} at {time} — STATUS: {status}"
+SLOT_LINE        = "  [{slot_id}] {type} with {doctor} ({department}) — {date} at {time}"
+
+# Next appointment number, seeded past the highest existing ID.
+# next() on a count is atomic, so concurrent bookings never share an ID.
+_apt_counter = itertools.count(max((int(apt_id[3:]) for apt_id in APPOINTMENTS), default=0) + 1)
+
 
 def lookup_appointment(apt_id: str) -> dict:
     """Look up a specific appointment by ID."""
+    apt_id = apt_id.upper()
     apt = get_appointment(apt_id)
     if apt:
         return {
             "success": True,
-            "appointment_id": apt_id.upper(),
+            "appointment_id": apt_id,
             "details": apt,
             "message": (
-                f"Appointment {apt_id.upper()} found.\n"
+                f"Appointment {apt_id} found.\n"
                 f"  Patient  : {apt['patient_name']}\n"
                 f"  Type     : {apt['type']}\n"
                 f"  Doctor   : {apt['doctor']}\n"
                 f"  Date     : {apt['date']} at {apt['time']}\n"
-                f"  Status   : {apt['status'].upper()}"
+                f"  Status   : {apt['status']}"
             )
         }
     return {
         "success": False,
-        "message": f"No appointment found with ID '{apt_id.upper()}'. Please check the ID and try again."
+        "message": f"No appointment found with ID '{apt_id}'. Please check the ID and try again."
     }
 
 
@@ -44,12 +57,10 @@ def view_all_appointments() -> dict:
             "message": "No appointments found in the system."
         }
 
-    summary = []
-    for apt_id, apt in APPOINTMENTS.items():
-        summary.append(
-            f"  [{apt_id}] {apt['type']} with {apt['doctor']} "
-            f"on {apt['date']} at {apt['time']} — STATUS: {apt['status'].upper()}"
-        )
+    summary = [
+        APPOINTMENT_LINE.format_map(apt | {"id": apt_id})
+        for apt_id, apt in APPOINTMENTS.items()
+    ]
 
     return {
         "success": True,
@@ -67,12 +78,7 @@ def view_available_slots() -> dict:
             "message": "No available slots at this time. Please call the clinic."
         }
 
-    lines = []
-    for slot in slots:
-        lines.append(
-            f"  [{slot['slot_id']}] {slot['type']} with {slot['doctor']} "
-            f"({slot['department']}) — {slot['date']} at {slot['time']}"
-        )
+    lines = [SLOT_LINE.format_map(slot) for slot in slots]
 
     return {
         "success": True,
@@ -83,9 +89,14 @@ def view_available_slots() -> dict:
 
 def book_appointment(
     patient_name: str,
-    slot_id: str
+    slot_id: str,
+    *,
+    booked_at: str = None
 ) -> dict:
-    """Book a new appointment for a patient using an available slot."""
+    """
+    Book a new appointment for a patient using an available slot.
+    Batch callers can pass one booked_at timestamp for the whole request.
+    """
     slot = get_slot(slot_id)
 
     if not slot:
@@ -95,21 +106,21 @@ def book_appointment(
         }
 
     # Generate a new appointment ID
-    new_id = f"APT{str(len(APPOINTMENTS) + 1).zfill(3)}"
+    new_id = f"APT{next(_apt_counter):03d}"
 
     # Add to appointments database
     APPOINTMENTS[new_id] = {
         "patient_name": patient_name,
-        "patient_id": f"P{uuid.uuid4().hex[:6].upper()}",
+        "patient_id": f"P{secrets.token_hex(3).upper()}",
         "date": slot["date"],
         "time": slot["time"],
         "doctor": slot["doctor"],
         "department": slot["department"],
         "type": slot["type"],
-        "status": "confirmed",
+        "status": STATUS_CONFIRMED,
         "phone": "***-***-****",
         "email": "***@***.***",
-        "booked_at": datetime.now().isoformat()
+        "booked_at": booked_at or datetime.now().isoformat(timespec="seconds")
     }
 
     return {
@@ -143,7 +154,7 @@ def reschedule_appointment(apt_id: str, new_date: str, new_time: str) -> dict:
             "message": f"Cannot reschedule: Appointment '{apt_id}' not found."
         }
 
-    if apt["status"] == "cancelled":
+    if apt["status"] == STATUS_CANCELLED:
         return {
             "success": False,
             "message": f"Cannot reschedule: Appointment '{apt_id}' has already been cancelled."
@@ -154,7 +165,7 @@ def reschedule_appointment(apt_id: str, new_date: str, new_time: str) -> dict:
 
     APPOINTMENTS[apt_id]["date"] = new_date
     APPOINTMENTS[apt_id]["time"] = new_time
-    APPOINTMENTS[apt_id]["status"] = "rescheduled"
+    APPOINTMENTS[apt_id]["status"] = STATUS_RESCHEDULED
 
     return {
         "success": True,
@@ -184,13 +195,13 @@ def cancel_appointment(apt_id: str, reason: str = "Not provided") -> dict:
             "message": f"Cannot cancel: Appointment '{apt_id}' not found."
         }
 
-    if apt["status"] == "cancelled":
+    if apt["status"] == STATUS_CANCELLED:
         return {
             "success": False,
             "message": f"Appointment '{apt_id}' is already cancelled."
         }
 
-    APPOINTMENTS[apt_id]["status"] = "cancelled"
+    APPOINTMENTS[apt_id]["status"] = STATUS_CANCELLED
 
     return {
         "success": True,